@@ -1,71 +1,166 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
-from pydantic import BaseModel, conint, confloat, EmailStr
+from pydantic import BaseModel, conint, confloat, constr, EmailStr, ValidationError, model_validator
+import asyncio
 import uuid
 import warnings
-import tempfile
+import io
+import logging
+import logging.handlers
+import queue
 import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import MappingProxyType
 from typing import List
+import orjson
+import redis.asyncio as redis
 from reportlab.pdfgen import canvas
 from reportlab.graphics.barcode import code128
 from reportlab.lib.pagesizes import landscape, A6
 from reportlab.lib.units import mm
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType, Disposition
+from sendgrid.helpers.mail import (
+    Mail, Attachment, FileContent, FileName, FileType, Disposition, Personalization, To
+)
 import base64
+import httpx
 import stripe
 from dotenv import load_dotenv
 
 # ================== Load Environment Variables ==================
 load_dotenv()
 
-ENV = os.getenv("ENV", "development")  # "production" or "development"
-FRONTEND_URL = os.getenv("FRONTEND_URL", "https://iluminous-candle-uk-fe.onrender.com")
+# Validated once at import: a missing key fails the boot instead of every request
+class Settings(BaseModel):
+    env: str
+    frontend_url: str
+    stripe_secret_key: constr(min_length=1)
+    sendgrid_api_key: constr(min_length=1)
+    from_email: EmailStr
+    admin_email: EmailStr
+    redis_url: str | None = None  # unset -> in-process storage (development only)
+
+    @property
+    def is_production(self) -> bool:
+        return self.env == "production"
+
+    @model_validator(mode="after")
+    def require_redis_in_production(self):
+        # Multiple workers can only share orders through Redis
+        if self.is_production and not self.redis_url:
+            raise ValueError("REDIS_URL is required when ENV=production")
+        return self
+
+def get_settings() -> Settings:
+    env = os.getenv("ENV", "development")  # "production" or "development"
+    stripe_key_var = "STRIPE_SECRET_KEY_LIVE" if env == "production" else "STRIPE_SECRET_KEY_TEST"
+    # Settings field -> environment variable the operator actually sets
+    env_vars = {
+        "env": "ENV",
+        "frontend_url": "FRONTEND_URL",
+        "stripe_secret_key": stripe_key_var,
+        "sendgrid_api_key": "SENDGRID_API_KEY",
+        "from_email": "FROM_EMAIL",
+        "admin_email": "ADMIN_EMAIL",
+        "redis_url": "REDIS_URL",
+    }
+    values = {field: os.getenv(var) or None for field, var in env_vars.items()}
+    values["env"] = env
+    values["frontend_url"] = values["frontend_url"] or "https://iluminous-candle-uk-fe.onrender.com"
+
+    # Drop unset variables so validation reports them as missing fields
+    try:
+        return Settings(**{field: value for field, value in values.items() if value is not None})
+    except ValidationError as e:
+        problems = [
+            f"{env_vars[err['loc'][0]]}: {err['msg']}" if err["loc"] else err["msg"]
+            for err in e.errors()
+        ]
+        raise RuntimeError(f"Invalid configuration: {'; '.join(problems)}") from None
 
-if ENV == "production":
-    STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY_LIVE")
-else:
-    STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY_TEST")
+settings = get_settings()
 
-stripe.api_key = STRIPE_SECRET_KEY
+ENV = settings.env
+IS_PRODUCTION = settings.is_production
+FRONTEND_URL = settings.frontend_url
+STRIPE_SECRET_KEY = settings.stripe_secret_key
 
-SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
-FROM_EMAIL = os.getenv("FROM_EMAIL")
-ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
+stripe.api_key = STRIPE_SECRET_KEY
+# Keep-alive connection pool shared by every Stripe call, with retries on transient failures
+stripe.default_http_client = stripe.RequestsClient(verify_ssl_certs=True)
+stripe.max_network_retries = 2
+
+SENDGRID_API_KEY = settings.sendgrid_api_key
+FROM_EMAIL = settings.from_email
+ADMIN_EMAIL = settings.admin_email
+REDIS_URL = settings.redis_url
+
+# Request handlers only enqueue log records; a listener thread does the actual stderr writes
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+# Root stays at WARNING so httpx/httpcore/hpack request chatter isn't logged
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
+)
+logger = logging.getLogger("luminous")
+logger.setLevel(logging.INFO if IS_PRODUCTION else logging.DEBUG)
 
 warnings.filterwarnings("ignore", message="Unverified HTTPS request")
 
-sg_client = SendGridAPIClient(SENDGRID_API_KEY)
+# The SendGrid SDK opens a fresh HTTPS connection per send, so post to the v3 API
+# directly over one pooled async client instead
+sendgrid_http = httpx.AsyncClient(
+    base_url="https://api.sendgrid.com",
+    headers={"Authorization": f"Bearer {SENDGRID_API_KEY}"},
+    http2=True,
+    timeout=10.0,
+)
 
 # ================== FastAPI Setup ==================
-app = FastAPI(title="Luminous Candles API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await sendgrid_http.aclose()
+    if redis_client:
+        await redis_client.aclose()
+    _log_listener.stop()
+
+app = FastAPI(title="Luminous Candles API", version="1.0.0", lifespan=lifespan)
+
+# FRONTEND_URL defaults to the Render frontend, so dedupe while keeping order
+ALLOWED_ORIGINS = tuple(dict.fromkeys([
+    FRONTEND_URL,
+    "https://iluminous-candle-uk-fe.onrender.com",
+    "http://192.168.178.65:3033",
+    "http://127.0.0.1:3033",
+    "http://localhost:3033",
+]))
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        FRONTEND_URL,
-        "https://iluminous-candle-uk-fe.onrender.com",
-        "http://192.168.178.65:3033",
-        "http://127.0.0.1:3033",
-        "http://localhost:3033",
-    ],
+    allow_origins=list(ALLOWED_ORIGINS),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,  # let browsers cache preflights for a day
 )
 
 # ----------------- Root Route -----------------
-@app.get("/", response_class=HTMLResponse)
-async def home():
-    return f"""
+# Static page, so render it once at import and hand back the same response
+_HOME_HTML = """
     <html>
       <head>
         <title>Luminous Candles API</title>
         <style>
-          body {{ font-family: Arial; text-align: center; margin-top: 10%; background: #fafafa; color: #333; }}
-          h1 {{ color: #d4a017; }}
-          p {{ font-size: 1.1em; }}
+          body { font-family: Arial; text-align: center; margin-top: 10%; background: #fafafa; color: #333; }
+          h1 { color: #d4a017; }
+          p { font-size: 1.1em; }
         </style>
       </head>
       <body>
@@ -75,6 +170,14 @@ async def home():
       </body>
     </html>
     """
+_HOME_RESPONSE = HTMLResponse(
+    content=_HOME_HTML,
+    headers={"Cache-Control": "public, max-age=300"},
+)
+
+@app.get("/", response_class=HTMLResponse)
+async def home():
+    return _HOME_RESPONSE
 
 # ----------------- Models -----------------
 class Item(BaseModel):
@@ -104,54 +207,130 @@ class SuccessRequest(BaseModel):
     checkoutId: str | None = None
     client_email: EmailStr
 
+class CheckoutResponse(BaseModel):
+    url: str
+
+class OrderItem(Item):
+    line_total_cents: int
+
+class OrderResponse(BaseModel):
+    id: str
+    customer: CustomerInfo
+    cart: List[OrderItem]
+    subtotal: float
+    tax: float
+    shipping: float
+    total: float
+
+class SuccessResponse(BaseModel):
+    status: str
+    message: str
+
 # ----------------- Storage -----------------
-ORDERS_DB = {}
+ORDER_TTL_SECONDS = 86400
+ORDER_CACHE_SIZE = 256
+
+redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
+ORDERS_DB = {}  # fallback when REDIS_URL is not configured
+
+# Orders never change once stored, so a small per-worker cache is safe for hot reads.
+# Each entry remembers when its Redis copy expires so the cache never outlives it.
+_ORDER_CACHE: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+def _cache_order(order: dict, ttl_seconds: float = ORDER_TTL_SECONDS):
+    _ORDER_CACHE[order["id"]] = (time.monotonic() + ttl_seconds, order)
+    _ORDER_CACHE.move_to_end(order["id"])
+    if len(_ORDER_CACHE) > ORDER_CACHE_SIZE:
+        _ORDER_CACHE.popitem(last=False)
+
+async def store_order(order: dict):
+    if redis_client:
+        await redis_client.set(f"order:{order['id']}", orjson.dumps(order), ex=ORDER_TTL_SECONDS)
+    else:
+        ORDERS_DB[order["id"]] = order
+    _cache_order(order)
+
+async def fetch_order(checkout_id: str) -> dict | None:
+    cached = _ORDER_CACHE.get(checkout_id)
+    if cached:
+        expires_at, order = cached
+        if time.monotonic() < expires_at:
+            _ORDER_CACHE.move_to_end(checkout_id)
+            return order
+        del _ORDER_CACHE[checkout_id]
+
+    ttl_seconds = ORDER_TTL_SECONDS
+    if redis_client:
+        key = f"order:{checkout_id}"
+        async with redis_client.pipeline(transaction=False) as pipe:
+            raw, ttl_ms = await pipe.get(key).pttl(key).execute()
+        order = orjson.loads(raw) if raw else None
+        if ttl_ms > 0:
+            ttl_seconds = ttl_ms / 1000
+    else:
+        order = ORDERS_DB.get(checkout_id)
+
+    if order:
+        _cache_order(order, ttl_seconds)
+    return order
 
-# ----------------- Stripe Payment Link -----------------
-def create_payment_link(items: List[Item], customer: CustomerInfo, total: float, checkout_id: str) -> str:
-    try:
-        line_items = [
-            {
-                "price_data": {
-                    "currency": "gbp",
-                    "product_data": {"name": item.name},
-                    "unit_amount": int(item.price * 100),
-                },
-                "quantity": item.qty,
-            }
-            for item in items
-        ]
+# ----------------- Order Totals -----------------
+def _line_item(name: str, unit_amount: int, quantity: int = 1) -> dict:
+    return {
+        "price_data": {
+            "currency": "gbp",
+            "product_data": {"name": name},
+            "unit_amount": unit_amount,
+        },
+        "quantity": quantity,
+    }
 
-        subtotal = sum(item.price * item.qty for item in items)
-        tax_rate = get_tax_rate_by_state(customer.state)
-        tax = round(subtotal * tax_rate, 2)
-        shipping = 5.99 if subtotal <= 50 else 0.0
-
-        if tax > 0:
-            line_items.append({
-                "price_data": {
-                    "currency": "gbp",
-                    "product_data": {"name": "Sales Tax"},
-                    "unit_amount": int(tax * 100),
-                },
-                "quantity": 1,
-            })
-
-        if shipping > 0:
-            line_items.append({
-                "price_data": {
-                    "currency": "gbp",
-                    "product_data": {"name": "Shipping"},
-                    "unit_amount": int(shipping * 100),
-                },
-                "quantity": 1,
-            })
+# All amounts in integer pence, exactly what Stripe charges
+@dataclass
+class OrderTotals:
+    line_items: list[dict]
+    line_totals_cents: list[int]
+    subtotal_cents: int
+    tax_cents: int
+    shipping_cents: int
+
+    @property
+    def total_cents(self) -> int:
+        return self.subtotal_cents + self.tax_cents + self.shipping_cents
+
+def compute_order_totals(items: List[Item], state: str) -> OrderTotals:
+    # Single pass over the cart builds the Stripe line items and the subtotal together
+    line_items = []
+    line_totals_cents = []
+    subtotal_cents = 0
+    for item in items:
+        unit_amount = int(round(item.price * 100))
+        line_total = unit_amount * item.qty
+        subtotal_cents += line_total
+        line_totals_cents.append(line_total)
+        line_items.append(_line_item(item.name, unit_amount, item.qty))
+
+    tax_rate_bps = int(round(get_tax_rate_by_state(state) * 10000))
+    tax_cents = (subtotal_cents * tax_rate_bps + 5000) // 10000  # round half up
+    shipping_cents = 599 if subtotal_cents <= 5000 else 0
+
+    if tax_cents > 0:
+        line_items.append(_line_item("Sales Tax", tax_cents))
+    if shipping_cents > 0:
+        line_items.append(_line_item("Shipping", shipping_cents))
+
+    return OrderTotals(line_items, line_totals_cents, subtotal_cents, tax_cents, shipping_cents)
 
+# ----------------- Stripe Payment Link -----------------
+async def create_payment_link(totals: OrderTotals, customer: CustomerInfo, checkout_id: str) -> str:
+    try:
         allowed_countries = ["US", "CA", "GB", "DE"]
 
-        session = stripe.checkout.Session.create(
+        # Run the blocking SDK call off the event loop so concurrent checkouts aren't serialized
+        session = await asyncio.to_thread(
+            stripe.checkout.Session.create,
             payment_method_types=["card"],
-            line_items=line_items,
+            line_items=totals.line_items,
             mode="payment",
             success_url=f"{FRONTEND_URL}/success.html?checkoutId={checkout_id}",
             cancel_url=f"{FRONTEND_URL}/cancel.html",
@@ -159,184 +338,218 @@ def create_payment_link(items: List[Item], customer: CustomerInfo, total: float,
             shipping_address_collection={"allowed_countries": allowed_countries},
         )
 
-        print(f"✅ Stripe session created: {session.url}")
+        logger.info("Stripe session created: %s", session.url)
         return session.url
 
     except stripe.error.StripeError as e:
-        print("[STRIPE ERROR]", e.user_message or str(e))
+        logger.error("Stripe error: %s", e.user_message or str(e))
         raise HTTPException(status_code=400, detail=e.user_message or str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ----------------- Email Utility -----------------
-def send_email(to_email: str, subject: str, html_content: str, attachments: list[str] = None):
+def pdf_attachment(pdf_bytes: bytes, filename: str) -> Attachment:
+    return Attachment(
+        FileContent(base64.b64encode(pdf_bytes).decode()),
+        FileName(filename),
+        FileType("application/pdf"),
+        Disposition("attachment"),
+    )
+
+async def send_email(to_emails: list[str], subject: str, html_content: str, attachments: list[Attachment] = None):
     message = Mail(
         from_email=FROM_EMAIL,
-        to_emails=to_email,
         subject=subject,
         html_content=html_content,
     )
 
-    if attachments:
-        for filepath in attachments:
-            try:
-                with open(filepath, "rb") as f:
-                    encoded = base64.b64encode(f.read()).decode()
-                    message.attachment = Attachment(
-                        FileContent(encoded),
-                        FileName(os.path.basename(filepath)),
-                        FileType("application/pdf"),
-                        Disposition("attachment"),
-                    )
-            except Exception as e:
-                print(f"[WARN] Could not attach file {filepath}: {e}")
+    # One personalization per recipient: a single API call, but nobody sees the other addresses
+    for to_email in to_emails:
+        personalization = Personalization()
+        personalization.add_to(To(to_email))
+        message.add_personalization(personalization)
+
+    # Attachments arrive pre-encoded so the same file is never re-read per send
+    for attachment in attachments or []:
+        message.add_attachment(attachment)
 
+    recipients = ", ".join(to_emails)
     try:
-        response = sg_client.send(message)
-        print(f"[OK] Email sent to {to_email}, Status: {response.status_code}")
+        response = await sendgrid_http.post("/v3/mail/send", json=message.get())
+        response.raise_for_status()
+        logger.info("Email sent to %s, status: %s", recipients, response.status_code)
         return True
     except Exception as e:
-        print(f"[ERROR] Email failed to {to_email}: {e}")
+        logger.error("Email failed to %s: %s", recipients, e)
         return False
 
 # ----------------- Tax Helper -----------------
+# Keys are lower-cased once here; lookups normalise the incoming state name
+_TAX_RATES = MappingProxyType({
+    "california": 0.075,
+    "new york": 0.04,
+    "texas": 0.045,
+    "florida": 0.06,
+    "illinois": 0.0625,
+    "nevada": 0.0685,
+    "washington": 0.065,
+})
+_DEFAULT_TAX = 0.07
+
 def get_tax_rate_by_state(state: str) -> float:
-    tax_rates = {
-        "California": 0.075,
-        "New York": 0.04,
-        "Texas": 0.045,
-        "Florida": 0.06,
-        "Illinois": 0.0625,
-        "Nevada": 0.0685,
-        "Washington": 0.065,
-    }
-    return tax_rates.get(state, 0.07)
+    return _TAX_RATES.get(state.strip().lower(), _DEFAULT_TAX)
 
 # ----------------- Label Generator -----------------
-def generate_local_label(order: dict, customer: dict, order_id: str) -> str:
+# reportlab embeds a JPEG path as-is without decoding it, so pass the path through;
+# only the existence check is done once
+LOGO_PATH = "images/LOGON.jpg"
+HAS_LOGO = os.path.exists(LOGO_PATH)
+
+# Layout is identical for every label, so resolve page size and mm offsets once
+PAGE_SIZE = landscape(A6)
+PAGE_W, PAGE_H = PAGE_SIZE
+
+# Margins
+TOP_M = 8 * mm
+SIDE_M = 8 * mm
+BOT_M = 12 * mm  # extra space for barcode
+
+# Logo
+LOGO_W = LOGO_H = 25 * mm
+Y_TOP = PAGE_H - TOP_M
+
+# FROM section
+FROM_X = SIDE_M + LOGO_W + 6 * mm
+FROM_Y = Y_TOP - 6 * mm
+SENDER_LINES = (
+    "Luminous Candles Ltd T/A Nelux Candles",
+    "71-75, Shelton Street, Covent Garden,",
+    "London, United Kingdom, WC2H 9JQ",
+)
+SENDER_LINE_YS = tuple(FROM_Y - ((i + 1) * 5 * mm) for i in range(len(SENDER_LINES)))
+
+# TO section
+TO_LABEL_Y = Y_TOP - LOGO_H - 20 * mm  # shifted slightly upward
+TO_START_Y = TO_LABEL_Y - 4 * mm  # small gap after "TO:"
+LINE_GAP = 6 * mm
+
+# Barcode
+BARCODE_H = 20 * mm
+BAR_W = 0.5 * mm
+
+def generate_local_label(order: dict, customer: dict, order_id: str) -> bytes | None:
     try:
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        c = canvas.Canvas(tmp.name, pagesize=landscape(A6))
-        width, height = landscape(A6)
-
-        # Margins
-        top_margin = 8 * mm
-        side_margin = 8 * mm
-        bottom_margin = 12 * mm  # extra space for barcode
-
-        # Logo
-        logo_path = "images/LOGON.jpg"
-        logo_w, logo_h = 25 * mm, 25 * mm
-        y_top = height - top_margin
-        if os.path.exists(logo_path):
+        # Render in memory; the PDF is only ever attached to an email
+        buf = io.BytesIO()
+        c = canvas.Canvas(buf, pagesize=PAGE_SIZE)
+
+        if HAS_LOGO:
             c.drawImage(
-                logo_path,
-                side_margin,
-                y_top - logo_h,
-                width=logo_w,
-                height=logo_h,
+                LOGO_PATH,
+                SIDE_M,
+                Y_TOP - LOGO_H,
+                width=LOGO_W,
+                height=LOGO_H,
                 preserveAspectRatio=True,
                 mask="auto",
             )
 
-        # FROM section
-        from_x = side_margin + logo_w + 6 * mm
-        from_y = y_top - 6 * mm
         c.setFont("Helvetica-Bold", 10)
-        c.drawString(from_x, from_y, "FROM:")
+        c.drawString(FROM_X, FROM_Y, "FROM:")
         c.setFont("Helvetica", 9)
-        sender_lines = [
-            "Luminous Candles Ltd T/A Nelux Candles",
-            "71-75, Shelton Street, Covent Garden,",
-            "London, United Kingdom, WC2H 9JQ",
-        ]
-        for i, line in enumerate(sender_lines):
-            c.drawString(from_x, from_y - ((i + 1) * 5 * mm), line)
+        for line, y in zip(SENDER_LINES, SENDER_LINE_YS):
+            c.drawString(FROM_X, y, line)
 
-        # TO section
         c.setFont("Helvetica-Bold", 11)
-        y_to_start = y_top - logo_h - 20 * mm  # shifted slightly upward
-        c.drawString(side_margin, y_to_start, "TO:")
+        c.drawString(SIDE_M, TO_LABEL_Y, "TO:")
 
         c.setFont("Helvetica-Bold", 14)
-        line_gap = 6 * mm
         to_lines = [
             customer.get("fullName", ""),
             customer.get("address", ""),
             f"{customer.get('city', '')}, {customer.get('state', '')} {customer.get('zip', '')}",
             customer.get("country", "GB"),
         ]
-
-        # Compute vertical space for TO block
-        total_text_height = len(to_lines) * line_gap
-        start_y = y_to_start - 4 * mm  # small gap after "TO:"
         for i, text in enumerate(to_lines):
-            c.drawCentredString(width / 2, start_y - (i * line_gap), text)
+            c.drawCentredString(PAGE_W / 2, TO_START_Y - (i * LINE_GAP), text)
 
         # Barcode at bottom with proper margin
-        barcode_height = 20 * mm
-        barcode = code128.Code128(order_id, barHeight=barcode_height, barWidth=0.5 * mm)
-        barcode_x = (width - barcode.width) / 2
-        barcode_y = bottom_margin
-        barcode.drawOn(c, barcode_x, barcode_y)
+        barcode = code128.Code128(order_id, barHeight=BARCODE_H, barWidth=BAR_W)
+        barcode.drawOn(c, (PAGE_W - barcode.width) / 2, BOT_M)
 
         # Save PDF
         c.showPage()
         c.save()
-        return tmp.name
+        return buf.getvalue()
 
     except Exception as e:
-        print(f"[ERROR] Failed to generate label: {e}")
+        logger.error("Failed to generate label: %s", e)
         return None
 
 
 # ----------------- Checkout API -----------------
-@app.post("/create-checkout-session")
+async def persist_order(order: dict):
+    try:
+        await store_order(order)
+    except Exception:
+        logger.exception("Failed to store order %s", order["id"])
+        raise HTTPException(status_code=503, detail="Order could not be saved, please try again")
+
+@app.post("/create-checkout-session", response_model=CheckoutResponse)
 async def create_checkout_session(request: CheckoutRequest):
-    print("✅ Checkout request received:", request.dict())
+    dumped = request.model_dump()
+    if not IS_PRODUCTION:
+        logger.debug("Checkout request received: %s", dumped)
     try:
-        subtotal = sum(item.price * item.qty for item in request.cart)
-        if subtotal < 0.5:
+        totals = compute_order_totals(request.cart, request.customer.state)
+        if totals.subtotal_cents < 50:
             raise HTTPException(status_code=400, detail="Order total must be at least £0.50")
-        tax_rate = get_tax_rate_by_state(request.customer.state)
-        tax = round(subtotal * tax_rate, 2)
-        shipping = 5.99 if subtotal <= 50 else 0.0
-        total = round(subtotal + tax + shipping, 2)
 
         checkout_id = str(uuid.uuid4())
-        checkout_url = create_payment_link(request.cart, request.customer, total, checkout_id)
-
-        ORDERS_DB[checkout_id] = {
+        order = {
             "id": checkout_id,
-            "customer": request.customer.dict(),
-            "cart": [i.dict() for i in request.cart],
-            "subtotal": subtotal,
-            "tax": tax,
-            "shipping": shipping,
-            "total": total,
+            "customer": dumped["customer"],
+            # Line totals are stored so the confirmation email needs no arithmetic
+            "cart": [
+                {**item, "line_total_cents": line_total}
+                for item, line_total in zip(dumped["cart"], totals.line_totals_cents)
+            ],
+            "subtotal": totals.subtotal_cents / 100,
+            "tax": totals.tax_cents / 100,
+            "shipping": totals.shipping_cents / 100,
+            "total": totals.total_cents / 100,
         }
 
+        # The order doesn't depend on the Stripe session, so write it during the Stripe
+        # round-trip; it still lands before the URL is handed out
+        checkout_url, _ = await asyncio.gather(
+            create_payment_link(totals, request.customer, checkout_id),
+            persist_order(order),
+        )
+
         return {"url": checkout_url}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # ----------------- Order Fetch -----------------
-@app.get("/order/{checkout_id}")
+@app.get("/order/{checkout_id}", response_model=OrderResponse)
 async def get_order(checkout_id: str):
-    order = ORDERS_DB.get(checkout_id)
+    order = await fetch_order(checkout_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 # ----------------- Payment Success -----------------
-@app.post("/payment-success")
+@app.post("/payment-success", response_model=SuccessResponse)
 async def payment_success(req: SuccessRequest):
-    if not req.checkoutId or req.checkoutId not in ORDERS_DB:
+    order = await fetch_order(req.checkoutId) if req.checkoutId else None
+    if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    order = ORDERS_DB[req.checkoutId]
     items_html = "".join([
-        f"<li>{item['qty']} × {item['name']} — £{item['price']*item['qty']:.2f}</li>"
+        f"<li>{item['qty']} × {item['name']} — £{item['line_total_cents'] / 100:.2f}</li>"
         for item in order["cart"]
     ])
 
@@ -351,8 +564,15 @@ async def payment_success(req: SuccessRequest):
        <b>Total: £{order['total']:.2f}</b></p>
     """
 
-    send_email(req.client_email, "Your Order Confirmation", html)
-    label = generate_local_label(order, req.customer.dict(), req.checkoutId)
-    send_email(ADMIN_EMAIL, f"New Order ({req.checkoutId})", html, [label] if label else None)
+    async def send_admin_copy():
+        # The label renders while the customer's confirmation is already in flight
+        label = await asyncio.to_thread(generate_local_label, order, req.customer.model_dump(), req.checkoutId)
+        attachments = [pdf_attachment(label, f"label_{req.checkoutId}.pdf")] if label else None
+        await send_email([ADMIN_EMAIL], f"New Order ({req.checkoutId})", html, attachments)
+
+    await asyncio.gather(
+        send_email([req.client_email], "Your Order Confirmation", html),
+        send_admin_copy(),
+    )
 
     return {"status": "success", "message": "Order confirmed and emails sent"}